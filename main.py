@@ -1,108 +1,537 @@
 import os
-import json
+import asyncio
+import hashlib
+import gzip
+import httpx
+import orjson
 import uvicorn
 import logging
-from typing import Dict, Optional
+import logging.handlers
+import queue
+import atexit
+from typing import Dict, Optional, Tuple
+from cachetools import TTLCache
 from fastapi import FastAPI, WebSocket, Request
 from fastapi.responses import Response
-from openai import AsyncOpenAI
+from fastapi.websockets import WebSocketDisconnect, WebSocketState
 from dotenv import load_dotenv
-from twilio.rest import Client
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 import time
-from litellm import acompletion
-import litellm
+import uuid
+from urllib.parse import parse_qsl
+from dataclasses import dataclass, field
+from contextlib import aclosing, asynccontextmanager
+from functools import lru_cache
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s',
+# Records are handed to a background thread so stream writes never block the event loop
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter(
+    fmt='%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
-)
-logging.getLogger('twilio').setLevel(logging.WARNING)
-
+))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Full format is applied by the listener
 load_dotenv()
-app = FastAPI()
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-twilio_client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+log_level_name = (os.getenv("LOG_LEVEL") or "INFO").upper()
+log_level = logging.getLevelNamesMapping().get(log_level_name)
+logging.basicConfig(
+    level=logging.INFO if log_level is None else log_level,
+    handlers=[log_queue_handler]
+)
+log_listener.start()
+atexit.register(log_listener.stop)
+if log_level is None:
+    # A typo shouldn't stop the service from starting
+    logging.warning("Unknown LOG_LEVEL %r; using INFO", log_level_name)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(evict_stale_sessions())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        await openai_http_client.aclose()
+        await twilio_http_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+# Shared HTTP/2 pool so concurrent translation streams reuse warm connections
+openai_http_client = httpx.AsyncClient(
+    base_url="https://api.openai.com/v1",
+    headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"},
+    http2=True,
+    limits=httpx.Limits(max_connections=512, max_keepalive_connections=512, keepalive_expiry=120.0),
+    timeout=httpx.Timeout(connect=2.0, read=60.0, write=10.0, pool=None),
+)
+# Async client for the Twilio REST API, so call creation never blocks the event loop
+twilio_account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+twilio_http_client = httpx.AsyncClient(
+    base_url=f"https://api.twilio.com/2010-04-01/Accounts/{twilio_account_sid}",
+    auth=(twilio_account_sid or "", os.getenv("TWILIO_AUTH_TOKEN") or ""),
+    http2=True,
+    timeout=5.0,
+)
 music_url = "https://pub-09065925c50a4711a49096e7dbee29ce.r2.dev/ringtone-02-133354.mp3"
 wait_url = "https://pub-09065925c50a4711a49096e7dbee29ce.r2.dev/mixkit-marimba-ringtone-1359.wav"
 
+# End-of-stream frame, serialized once at import
+FINAL_SENTINEL = orjson.dumps({"token": "", "type": "text", "last": True}).decode()
+# Constant parts of a streamed text frame; only the token varies
+TEXT_FRAME_PREFIX = b'{"token":'
+TEXT_FRAME_SUFFIX = b',"last":false,"type":"text"}'
+TEXT_FRAME_LAST_SUFFIX = b',"last":true,"type":"text"}'
+# ConversationRelay TwiML, split at the url attribute: the head is constant and the
+# tail only varies with the language, TTS, voice and STT settings
+TWIML_HEAD = b'<?xml version="1.0" encoding="UTF-8"?><Response><Connect><ConversationRelay debug="speaker-events" url="'
+TWIML_TAIL_TEMPLATE = b'" language="%b" ttsProvider="%b"%b transcriptionProvider="%b"/></Connect></Response>'
+
 # Session management for translation pairs
 # Translation session management
+@dataclass(slots=True, eq=False)  # Sessions compare by identity, as before
 class TranslationSession:
-    def __init__(self, session_id: str, source_call_sid: str):
-        self.session_id = session_id
-        self.source_call_sid = source_call_sid  # Incoming call SID
-        self.target_call_sid: Optional[str] = None  # Outbound call SID
-        self.source_websocket: Optional[WebSocket] = None  # Incoming caller's WebSocket
-        self.target_websocket: Optional[WebSocket] = None  # Outbound caller's WebSocket
-        self.source_phone_number = None  # Incoming caller's phone
-        self.target_phone_number = None  # Outbound caller's phone
-        self.source_language = ""  # Default source language
-        self.target_language = ""  # Default target language
-        self.source_tts_provider = "ElevenLabs"  # Default source TTS provider
-        self.source_voice = ""  # Default source voice
-        self.target_tts_provider = "ElevenLabs"  # Default target TTS provider
-        self.target_voice = ""  # Default target voice
-        self.host = None  # Request host for WebSocket URLs
-        self.play_waiting_music = True  # Flag to control waiting music
+    session_id: str
+    source_call_sid: str  # Incoming call SID
+    target_call_sid: Optional[str] = None  # Outbound call SID
+    source_websocket: Optional[WebSocket] = None  # Incoming caller's WebSocket
+    target_websocket: Optional[WebSocket] = None  # Outbound caller's WebSocket
+    source_phone_number: Optional[str] = None  # Incoming caller's phone
+    target_phone_number: Optional[str] = None  # Outbound caller's phone
+    source_language: str = ""  # Default source language
+    target_language: str = ""  # Default target language
+    source_tts_provider: str = "ElevenLabs"  # Default source TTS provider
+    source_voice: str = ""  # Default source voice
+    target_tts_provider: str = "ElevenLabs"  # Default target TTS provider
+    target_voice: str = ""  # Default target voice
+    source_stt_provider: str = "deepgram"  # Set from source_language in /initiate-call
+    target_stt_provider: str = "deepgram"  # Set from target_language in /initiate-call
+    host: Optional[str] = None  # Request host for WebSocket URLs
+    play_waiting_music: bool = True  # Flag to control waiting music
+    router: Optional["SessionRouter"] = None  # Outbound writers, created once both legs are up
+    created_at: float = field(default_factory=time.monotonic)  # Used to evict sessions whose calls never connect
 
 # Session storage
 translation_sessions: Dict[str, TranslationSession] = {}
+SESSION_TTL = 3600.0  # Seconds a session may wait without any connected WebSocket
+SESSION_SWEEP_INTERVAL = 60.0
+
+async def evict_stale_sessions():
+    """Drop sessions whose calls never connected, e.g. busy or unanswered numbers"""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        cutoff = time.monotonic() - SESSION_TTL
+        stale = [
+            session_id for session_id, session in translation_sessions.items()
+            if session.created_at < cutoff and not session.source_websocket and not session.target_websocket
+        ]
+        for session_id in stale:
+            translation_sessions.pop(session_id, None)
+            logging.info("Evicted stale translation session %s", session_id)
+
+# Completion model; gpt-4.1-nano is the fastest and cheapest that translates reliably
+TRANSLATE_MODEL = os.getenv("TRANSLATE_MODEL", "gpt-4.1-nano")
+
+# Transient completion failures are retried with exponential backoff, but only
+# before the first token has been relayed
+TRANSLATE_MAX_RETRIES = 2
+TRANSLATE_RETRY_BACKOFF = 0.25  # Seconds before the first retry, doubled after each
+TRANSLATE_RETRY_STATUSES = frozenset({408, 409, 429})  # Retried along with any 5xx
+
+# Completed translations keyed by translation_cache_key()
+translation_cache: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+
+def translation_cache_key(text: str, source_lang: str, target_lang: str) -> bytes:
+    """Content-addressed cache key for a (source, target, normalized text) triple"""
+    # Fold case and whitespace runs so STT spacing differences still hit
+    normalized = " ".join(text.split()).casefold()
+    return hashlib.blake2b(f"{source_lang}\0{target_lang}\0{normalized}".encode(), digest_size=16).digest()
+
+# Languages whose regional variants use different scripts and still need a model pass
+SCRIPT_VARIANT_LANGUAGES = frozenset({"zh", "sr"})
+
+def is_same_language(source_lang: str, target_lang: str) -> bool:
+    """True when translating between the two language tags would be a no-op"""
+    source_lang, target_lang = source_lang.lower(), target_lang.lower()
+    if source_lang == target_lang:
+        return True
+    primary = source_lang.split("-", 1)[0]
+    return primary == target_lang.split("-", 1)[0] and primary not in SCRIPT_VARIANT_LANGUAGES
+
+@lru_cache(maxsize=256)
+def translation_system_message(source_lang: str, target_lang: str) -> dict:
+    """System message for a language pair, built once and shared by every request"""
+    return {"role": "system", "content": f"You are a professional real-time translator. Translate the following {source_lang} text to {target_lang}. Provide only the translation, no explanations or additional text."}
+
+class TranslationError(Exception):
+    """The completion API rejected a request or failed mid-stream"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for connection failures and the HTTP statuses worth another attempt"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in TRANSLATE_RETRY_STATUSES or status >= 500)
+
+def openai_error_message(payload: dict) -> str:
+    """Human-readable message from an OpenAI error body or SSE error event"""
+    error = payload.get("error")
+    if isinstance(error, dict):
+        return error.get("message") or str(error)
+    return str(error if error is not None else payload)
 
 async def translate_text_streaming(text: str, source_lang: str = "en-US", target_lang: str = "de-DE"):
-    """Streaming translation function using OpenAI"""
+    """Streaming translation function using OpenAI.
+
+    The final token is yielded with last=True; there is no separate empty end event
+    unless the translation itself is empty.
+    """
+    if not source_lang or not target_lang or is_same_language(source_lang, target_lang):
+        # Nothing to translate (e.g. en-US <-> en-GB) or no language to translate
+        # between; relay the prompt as is
+        yield {
+            "token": text,
+            "type": "text",
+            "last": True,
+        }
+        return
+
+    cache_key = translation_cache_key(text, source_lang, target_lang)
+    cached = translation_cache.get(cache_key)
+    if cached is not None:
+        # The router would coalesce replayed chunks into one frame anyway
+        yield {
+            "token": cached,
+            "type": "text",
+            "last": True,
+        }
+        return
+
     messages = [
-        {"role": "system", "content": f"You are a professional real-time translator. Translate the following {source_lang} text to {target_lang}. Provide only the translation, no explanations or additional text."},
+        translation_system_message(source_lang, target_lang),
         {"role": "user", "content": text}
     ]
     # logging.info(f"Translating text: {text} from {source_lang} to {target_lang}")
-    stream = await acompletion(
-        model="gpt-4.1-nano",
-        messages=messages,
-        stream=True,
-        temperature=0.3,  # Lower temperature for more consistent translations
-    )
-
-    async for chunk in stream:
-        if chunk.choices[0].delta.content is not None:
-            token = chunk.choices[0].delta.content
-            # logging.info(f"Received token from llm: {token}")
-            yield {
-                "token": token,
-                "last": False,
-                "type": "text",
-            }
-
+    body = orjson.dumps({
+        "model": TRANSLATE_MODEL,
+        "messages": messages,
+        "stream": True,
+        "temperature": 0,  # Deterministic output, so cached translations are safe to reuse
+    })
+
+    parts = []
+    # Hold back one delta so the final one can carry last=True
+    pending = ""
+    completed = False
+    # Read the SSE stream directly; only choices[0].delta.content is needed per chunk
+    for attempt in range(TRANSLATE_MAX_RETRIES + 1):
+        try:
+            async with openai_http_client.stream(
+                "POST", "/chat/completions", content=body, headers={"Content-Type": "application/json"}
+            ) as response:
+                if response.status_code >= 400:
+                    detail = (await response.aread()).decode(errors="replace")
+                    try:
+                        detail = openai_error_message(orjson.loads(detail))
+                    except (orjson.JSONDecodeError, AttributeError):
+                        pass  # Not a JSON error body; report it as text
+                    raise TranslationError(
+                        f"OpenAI returned HTTP {response.status_code}: {detail}", response.status_code
+                    )
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if data == "[DONE]":
+                        completed = True
+                        break
+                    payload = orjson.loads(data)
+                    if "error" in payload:
+                        raise TranslationError(f"OpenAI stream error: {openai_error_message(payload)}")
+                    choices = payload.get("choices")
+                    token = choices[0]["delta"].get("content") if choices else None
+                    if token:
+                        # logging.info(f"Received token from llm: {token}")
+                        parts.append(token)
+                        if pending:
+                            yield {
+                                "token": pending,
+                                "last": False,
+                                "type": "text",
+                            }
+                        pending = token
+            break
+        except (TranslationError, httpx.TransportError) as e:
+            # Once a token has been relayed a retry would repeat it to the listener
+            if parts or attempt == TRANSLATE_MAX_RETRIES or not is_retryable_error(e):
+                raise
+            delay = TRANSLATE_RETRY_BACKOFF * 2 ** attempt
+            logging.warning("Translation request failed (%s); retrying in %.2fs", e, delay)
+            await asyncio.sleep(delay)
+
+    # Only cache translations whose stream completed with some text
+    if completed and parts:
+        translation_cache[cache_key] = "".join(parts)
+    elif not completed:
+        logging.warning("Translation stream ended before [DONE]; not caching %d partial tokens", len(parts))
     yield {
-        "token": "",
+        "token": pending,
         "type": "text",
         "last": True,
     }
 
-def generate_conversation_relay_twiml(ws_url: str, language: str, tts_provider: str, voice: str = "") -> str:
-    """Generate TwiML response for ConversationRelay with language and TTS settings"""
-    voice_attr = f' voice="{voice}"' if voice else ''
-    # Set transcription provider based on language
-    if language.startswith('ar-'):
-        stt_attr = f' transcriptionProvider="google"'
-    else:
-        stt_attr = f' transcriptionProvider="deepgram"'
-
-    twiml = f'''<?xml version="1.0" encoding="UTF-8"?>
-            <Response>
-                <Connect>
-                    <ConversationRelay
-                        debug="speaker-events"
-                        url="{ws_url}"
-                        language="{language}"
-                        ttsProvider="{tts_provider}"
-                        {voice_attr}
-                        {stt_attr}/>
-                </Connect>
-            </Response>'''
-    return twiml
+async def send_event(websocket: WebSocket, event: dict):
+    """Send a JSON event to ConversationRelay as a text frame, encoded with orjson"""
+    await websocket.send_text(orjson.dumps(event).decode())
+
+def encode_text_token(token: str, last: bool = False) -> str:
+    """Encode a streamed text token frame without building an event dict"""
+    return (TEXT_FRAME_PREFIX + orjson.dumps(token) + (TEXT_FRAME_LAST_SUFFIX if last else TEXT_FRAME_SUFFIX)).decode()
+
+# Outbox marker for the end of a translated turn
+END_OF_TURN = object()
+
+# Mid-turn text waits up to FRAME_FLUSH_WINDOW seconds for a batch of characters
+# to gather, so consecutive LLM tokens share a frame. The first text of a turn and
+# anything that ends one are sent straight away. The batch starts at
+# FRAME_FLUSH_CHARS and grows by FRAME_FLUSH_GROWTH per frame up to FRAME_FLUSH_CHARS_MAX.
+FRAME_FLUSH_CHARS = 16
+FRAME_FLUSH_GROWTH = 3
+FRAME_FLUSH_CHARS_MAX = 144
+FRAME_FLUSH_WINDOW = 0.02
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-run
+background_tasks: set = set()
+
+class PreparedFrame:
+    """A fixed outbound event, serialized once and reused for every send"""
+    __slots__ = ("text",)
+
+    def __init__(self, event: dict):
+        self.text = orjson.dumps(event).decode()
+
+WAIT_FRAME = PreparedFrame({
+    "type": "play",
+    "source": wait_url,
+    "loop": 0,
+    "preemptible": True,
+    "interruptible": False
+})
+MUSIC_FRAME = PreparedFrame({
+    "type": "play",
+    "source": music_url,
+    "loop": 0,
+    "preemptible": True,
+    "interruptible": True
+})
+END_FRAME = PreparedFrame({
+    "type": "end",
+    "handoffData": "clean up session"
+})
+
+class CoalescingBuffer:
+    """Outbox for one websocket leg, pushed from the event loop, drained by one writer.
+
+    Both the peer's relay_translation and this leg's play_waiting_music push
+    into it. Text deltas pushed while the writer has not yet claimed the buffer
+    are appended to the tail entry, so a writer that falls behind receives fewer,
+    larger frames instead of a growing backlog. Other items (END_OF_TURN,
+    PreparedFrames, event dicts) are kept as separate entries in order.
+    """
+    __slots__ = ("_items", "_ready")
+
+    def __init__(self):
+        self._items: list = []
+        self._ready = asyncio.Event()
+
+    def push(self, item):
+        items = self._items
+        if isinstance(item, str) and items and isinstance(items[-1], str):
+            items[-1] += item
+        else:
+            items.append(item)
+        self._ready.set()
+
+    async def pop(self) -> list:
+        """Wait for and claim everything pushed since the last pop"""
+        await self._ready.wait()
+        self._ready.clear()
+        items, self._items = self._items, []
+        return items
+
+    async def top_up(self, items: list, min_chars: int, window: float) -> list:
+        """Keep claiming pushes onto items while its text tail is shorter than
+        min_chars, for at most window seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + window
+        while items and isinstance(items[-1], str) and len(items[-1]) < min_chars:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                async with asyncio.timeout(remaining):
+                    await self._ready.wait()
+            except TimeoutError:
+                break
+            self._ready.clear()
+            more, self._items = self._items, []
+            if more and isinstance(more[0], str):
+                items[-1] += more.pop(0)
+            items.extend(more)
+        return items
+
+    def clear(self):
+        self._items = []
+        self._ready.clear()
+
+class SessionRouter:
+    """Owns the outbound path to both legs of a translation session.
+
+    Each leg has a CoalescingBuffer drained by its own writer task, so frames
+    to a websocket are never sent concurrently and a slow socket degrades
+    from one frame per delta towards one frame per sentence. A failed write on
+    either leg ends the whole session, since translation can no longer flow
+    both ways.
+    """
+    __slots__ = ("session_id", "to_source", "to_target", "closed", "_writers")
+
+    def __init__(self, session_id: str, source_websocket: WebSocket, target_websocket: WebSocket):
+        self.session_id = session_id
+        self.to_source = CoalescingBuffer()
+        self.to_target = CoalescingBuffer()
+        self.closed = False
+        self._writers = [
+            asyncio.create_task(self.writer(source_websocket, self.to_source)),
+            asyncio.create_task(self.writer(target_websocket, self.to_target)),
+        ]
+
+    async def writer(self, websocket: WebSocket, buffer: CoalescingBuffer):
+        """Send everything claimed from a leg's buffer, one frame per entry"""
+        # Call the ASGI-level send directly, skipping the send_text wrapper on every write
+        send = websocket.send
+        mid_turn = False
+        flush_chars = FRAME_FLUSH_CHARS
+        while not self.closed:
+            items = await buffer.pop()
+            if mid_turn and len(items) == 1 and isinstance(items[0], str):
+                items = await buffer.top_up(items, flush_chars, FRAME_FLUSH_WINDOW)
+                flush_chars = min(flush_chars * FRAME_FLUSH_GROWTH, FRAME_FLUSH_CHARS_MAX)
+            if items:
+                # Only a trailing text token leaves a turn open
+                mid_turn = isinstance(items[-1], str)
+                if not mid_turn:
+                    flush_chars = FRAME_FLUSH_CHARS
+            try:
+                end = len(items)
+                i = 0
+                while i < end:
+                    item = items[i]
+                    i += 1
+                    if isinstance(item, str):
+                        # Fold an END_OF_TURN right behind the final text into the same frame
+                        last = i < end and items[i] is END_OF_TURN
+                        if last:
+                            i += 1
+                        text = encode_text_token(item, last)
+                    elif item is END_OF_TURN:
+                        text = FINAL_SENTINEL
+                    elif isinstance(item, PreparedFrame):
+                        text = item.text
+                    else:
+                        text = orjson.dumps(item).decode()
+                    await send({"type": "websocket.send", "text": text})
+            except WebSocketDisconnect:
+                # The peer hung up; expected while a session is being torn down
+                logging.info("WebSocket closed by peer, stopping writer")
+                self.end_session()
+            except Exception as e:
+                logging.error(f"Error writing to WebSocket: {e}")
+                self.end_session()
+
+    def end_session(self):
+        """Stop routing and tear the session down from outside this writer task"""
+        if self.closed:
+            return
+        self.closed = True
+        # cleanup_session cancels the writers, so it can't be awaited from one of them
+        task = asyncio.create_task(cleanup_session(self.session_id))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+    def push(self, buffer: CoalescingBuffer, item):
+        """Queue an item for a leg"""
+        if not self.closed:
+            buffer.push(item)
+
+    async def relay_translation(self, buffer: CoalescingBuffer, text: str, source_lang: str, target_lang: str) -> str:
+        """Stream a translation into a leg's buffer.
+
+        Returns:
+            str: The full translated text
+        """
+        parts = []
+        # aclosing() closes the upstream response as soon as the loop stops early
+        async with aclosing(translate_text_streaming(text, source_lang, target_lang)) as events:
+            async for event in events:
+                if self.closed:
+                    break
+                token = event["token"]
+                if token:
+                    parts.append(token)
+                    self.push(buffer, token)
+                if event["last"]:
+                    # Pushed right behind the final token so the writer folds both into one frame
+                    self.push(buffer, END_OF_TURN)
+        return "".join(parts)
+
+    async def close(self):
+        """Stop both writers and drop anything still buffered"""
+        self.closed = True
+        for task in self._writers:
+            task.cancel()
+        await asyncio.gather(*self._writers, return_exceptions=True)
+        self.to_source.clear()
+        self.to_target.clear()
+
+def stt_provider_for(language: str) -> str:
+    """Transcription provider for a language; decided once per session"""
+    return "google" if language.startswith('ar-') else "deepgram"
+
+@lru_cache(maxsize=256)
+def twiml_tail(language: str, tts_provider: str, voice: str, stt_provider: str) -> bytes:
+    """TwiML after the url attribute; there are only a handful of distinct settings"""
+    voice_attr = b' voice="%b"' % voice.encode() if voice else b''
+    return TWIML_TAIL_TEMPLATE % (language.encode(), tts_provider.encode(), voice_attr, stt_provider.encode())
+
+def generate_conversation_relay_twiml(ws_url: str, language: str, tts_provider: str, voice: str = "", stt_provider: str = "deepgram") -> bytes:
+    """Generate TwiML response for ConversationRelay with language, TTS and STT settings"""
+    return TWIML_HEAD + ws_url.encode() + twiml_tail(language, tts_provider, voice, stt_provider)
+
+READY_MESSAGE = "You are ready to talk."
+# Ready message translations still in flight, so concurrent sessions share one
+# request; finished translations are served by translation_cache
+ready_message_tasks: Dict[str, asyncio.Task] = {}
+
+async def translate_ready_message(language: str) -> str:
+    parts = []
+    async for event in translate_text_streaming(READY_MESSAGE, "en-US", language):
+        parts.append(event["token"])
+    return "".join(parts)
+
+async def ready_message_text(language: str) -> str:
+    """Ready message in the given language, translating it at most once at a time"""
+    task = ready_message_tasks.get(language)
+    if task is None:
+        task = ready_message_tasks[language] = asyncio.create_task(translate_ready_message(language))
+        task.add_done_callback(lambda _: ready_message_tasks.pop(language, None))
+    # Shielded so one session hanging up doesn't cancel the translation for others
+    return await asyncio.shield(task)
 
 async def check_session_readiness_and_notify(session: TranslationSession, session_id: str) -> bool:
     """Check if session is ready and send appropriate notifications to users.
@@ -113,125 +542,109 @@ async def check_session_readiness_and_notify(session: TranslationSession, sessio
     if not (session.source_websocket and session.target_websocket):
         logging.info(f"Source or target websocket not ready for session {session_id}")
 
-        wait_event = {
-            "type": "play",
-            "source": wait_url,
-            "loop": 0,
-            "preemptible": True,
-            "interruptible": False
-        }
-
-        # Send waiting message in appropriate language to each participant
+        # Play the waiting tone to whichever participant is already connected
         if session.source_websocket:
-            await session.source_websocket.send_json(wait_event)
+            await session.source_websocket.send_text(WAIT_FRAME.text)
 
         if session.target_websocket:
-            await session.source_websocket.send_json(wait_event)
+            await session.target_websocket.send_text(WAIT_FRAME.text)
 
         return False
     else:
         # Send ready message in appropriate language to each participant
-        # Translate ready message to source language
-        source_ready_text = ""
-        async for event in translate_text_streaming(
-            "You are ready to talk.",
-            "en-US",
-            session.source_language
-        ):
-            source_ready_text += event["token"]
+        source_ready_text, target_ready_text = await asyncio.gather(
+            ready_message_text(session.source_language),
+            ready_message_text(session.target_language),
+        )
 
         ready_message_source = {
             "type": "text",
             "token": source_ready_text,
             "last": True,
         }
-        await session.source_websocket.send_json(ready_message_source)
-
-        # Translate ready message to target language
-        target_ready_text = ""
-        async for event in translate_text_streaming(
-            "You are ready to talk.",
-            "en-US",
-            session.target_language
-        ):
-            target_ready_text += event["token"]
+        await send_event(session.source_websocket, ready_message_source)
 
         ready_message_target = {
             "type": "text",
             "token": target_ready_text,
             "last": True,
         }
-        await session.target_websocket.send_json(ready_message_target)
+        await send_event(session.target_websocket, ready_message_target)
 
+        # From here on all outbound frames go through the per-leg writers
+        session.router = SessionRouter(session_id, session.source_websocket, session.target_websocket)
         return True
 
+async def end_leg(websocket: Optional[WebSocket], label: str):
+    """Tell one leg the session is over and close it"""
+    # Skip a leg whose peer already hung up; there is nobody left to tell
+    if (not websocket or websocket.client_state is not WebSocketState.CONNECTED
+            or websocket.application_state is not WebSocketState.CONNECTED):
+        return
+    try:
+        await websocket.send_text(END_FRAME.text)
+        await websocket.close()
+    except Exception as e:
+        logging.error(f"Error closing {label} WebSocket: {e}")
+
 async def cleanup_session(session_id: str):
-    
-    if session_id not in translation_sessions:
+    # Unregister up front so the peer leg's cleanup is a no-op and the session
+    # can't leak even if the closing awaits below fail
+    session = translation_sessions.pop(session_id, None)
+    if session is None:
         return
-    
-    session = translation_sessions[session_id]
-    end_message = {
-        "type": "end",
-        "handoffData": "clean up session"
-    }
-    
-    if session.source_websocket:
-        try:
-            await session.source_websocket.send_json(end_message)
-            await session.source_websocket.close()
-        except Exception as e:
-            logging.error(f"Error closing source WebSocket: {e}")
-        finally:
-            session.source_websocket = None
-    
-    if session.target_websocket:
-        try:
-            await session.target_websocket.send_json(end_message)
-            await session.target_websocket.close()
-        except Exception as e:
-            logging.error(f"Error closing target WebSocket: {e}")
-        finally:
-            session.target_websocket = None
-    
-    translation_sessions.pop(session_id, None)
+
+    if session.router:
+        await session.router.close()
+        session.router = None
+
+    # Both legs get the same pre-serialized end frame and are closed concurrently
+    await asyncio.gather(
+        end_leg(session.source_websocket, "source"),
+        end_leg(session.target_websocket, "target"),
+    )
+    session.source_websocket = None
+    session.target_websocket = None
+
     logging.info(f"Translation session {session_id} removed")
 
-async def play_waiting_music(websocket: WebSocket):
+async def play_waiting_music(router: SessionRouter, buffer: CoalescingBuffer):
     """Play music while waiting for response"""
-    music_event = {
-        "type": "play",
-        "source": music_url,
-        "loop": 0,
-        "preemptible": True,
-        "interruptible": True
-    }
-    await websocket.send_json(music_event)
+    router.push(buffer, MUSIC_FRAME)
+
+async def create_twilio_call(to_number: str, from_number: str, webhook_url: str) -> str:
+    """Create a recorded outbound call through the Twilio REST API.
+
+    Returns:
+        str: The SID of the created call
+    """
+    response = await twilio_http_client.post("/Calls.json", data={
+        "To": to_number,
+        "From": from_number,
+        "Url": webhook_url,
+        "Method": "POST",
+        "Record": "true",
+    })
+    response.raise_for_status()
+    return orjson.loads(response.content)["sid"]
 
 async def create_outbound_target_call(session_id: str, host: str, target_number: str, twilio_number: str):
     """Create outbound call to target language speaker"""
     try:
         # Get existing session and update it
-        if session_id not in translation_sessions:
+        session = translation_sessions.get(session_id)
+        if session is None:
             logging.error(f"Session {session_id} not found!")
             return
 
-        session = translation_sessions[session_id]
-
         # Use the host passed from the incoming request
         webhook_url = f"https://{host}/voice/target/{session_id}"
         logging.info(f"Webhook URL for target caller: {webhook_url}")
-        call = twilio_client.calls.create(
-            to=target_number,
-            from_=twilio_number,
-            url=webhook_url,
-            method="POST",
-            record=True
-        )
+        call_sid = await create_twilio_call(target_number, twilio_number, webhook_url)
 
         # Update session with target call info
-        session.target_call_sid = call.sid
-        logging.info(f"Created outbound call to target number: {call.sid}")
+        session.target_call_sid = call_sid
+        logging.info(f"Created outbound call to target number: {call_sid}")
 
     except Exception as e:
         logging.error(f"Error creating outbound call: {e}")
@@ -240,192 +653,176 @@ async def create_outbound_source_call(session_id: str, host: str, source_number:
     """Create outbound call to source language speaker"""
     try:
         # Get existing session and update it
-        if session_id not in translation_sessions:
+        session = translation_sessions.get(session_id)
+        if session is None:
             logging.error(f"Session {session_id} not found!")
             return
 
-        session = translation_sessions[session_id]
-
         # Use the host passed from the incoming request
         webhook_url = f"https://{host}/voice/source/{session_id}"
         logging.info(f"Webhook URL for source caller: {webhook_url}")
-        call = twilio_client.calls.create(
-            to=source_number,
-            from_=twilio_number,
-            url=webhook_url,
-            method="POST",
-            record=True
-        )
+        call_sid = await create_twilio_call(source_number, twilio_number, webhook_url)
 
         # Update session with source call info
-        session.source_call_sid = call.sid
-        logging.info(f"Created outbound call to source number: {call.sid}")
+        session.source_call_sid = call_sid
+        logging.info(f"Created outbound call to source number: {call_sid}")
 
     except Exception as e:
         logging.error(f"Error creating outbound source call: {e}")
 
-@app.websocket("/ws/source/{session_id}")
-async def source_websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for source language callers"""
-    await websocket.accept()
+@dataclass(slots=True)
+class SessionContext:
+    """Per-connection state shared by the websocket message handlers"""
+    session_id: str
+    websocket: WebSocket
+    is_source: bool  # True for the source language leg, False for the target leg
+    label: str  # "Source" or "Target", used in log messages
     call_sid: Optional[str] = None
+    # Resolved once at setup and reused for every prompt on this connection
+    session: Optional[TranslationSession] = None
+    from_lang: str = ""  # Language spoken on this leg
+    to_lang: str = ""  # Language spoken on the peer leg
+
+async def handle_setup(message: dict, ctx: SessionContext):
+    ctx.call_sid = message["callSid"]
+    logging.info("%s setup initiated for call SID: %s", ctx.label, ctx.call_sid)
+
+    # Attach this WebSocket to the session
+    session = ctx.session = translation_sessions.get(ctx.session_id)
+    if not session:
+        return
 
-    try:
-        while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            logging.info(f"Source WebSocket Message: {message}")
-
-            if message["type"] == "setup":
-                call_sid = message["callSid"]
-                logging.info(f"Source setup initiated for call SID: {call_sid}")
-
-                # Update session with source WebSocket
-                if session_id in translation_sessions:
-                    session = translation_sessions[session_id]
-                    session.source_websocket = websocket
+    if ctx.is_source:
+        session.source_websocket = ctx.websocket
+        ctx.from_lang, ctx.to_lang = session.source_language, session.target_language
+    else:
+        session.target_call_sid = ctx.call_sid
+        session.target_websocket = ctx.websocket
+        ctx.from_lang, ctx.to_lang = session.target_language, session.source_language
 
-                    if not await check_session_readiness_and_notify(session, session_id):
-                        continue  # Skip this prompt if not ready
+    await check_session_readiness_and_notify(session, ctx.session_id)
 
-            if message["type"] == "prompt":
-                prompt = message["voicePrompt"]
-                logging.info(f"Source prompt: {prompt}")
+async def handle_prompt(message: dict, ctx: SessionContext):
+    prompt = message["voicePrompt"]
+    logging.debug("%s prompt: %s", ctx.label, prompt)
 
-                # Get session for language configuration
-                if session_id in translation_sessions:
-                    session = translation_sessions[session_id]
-                    source_lang = session.source_language
-                    target_lang = session.target_language
+    session = ctx.session
+    router = session.router if session else None
+    if not router:
+        return  # Skip this prompt if not ready
 
-                    if not session.target_websocket:
-                        continue  # Skip this prompt if not ready
+    if ctx.is_source:
+        peer_buffer, own_buffer = router.to_target, router.to_source
+    else:
+        peer_buffer, own_buffer = router.to_source, router.to_target
 
-                    # Translate using streaming
-                    translated_text = ""
-                    async for event in translate_text_streaming(prompt, source_lang, target_lang):
-                        await session.target_websocket.send_json(event)
-                        translated_text += event["token"]
+    # Translate using streaming
+    try:
+        translated_text = await router.relay_translation(peer_buffer, prompt, ctx.from_lang, ctx.to_lang)
+    except (TranslationError, httpx.HTTPError) as e:
+        # Close the listener's turn but keep both calls up; the next prompt may succeed
+        logging.error("%s translation failed: %s", ctx.label, e)
+        router.push(peer_buffer, END_OF_TURN)
+        return
 
-                    logging.info(f"Translated from {source_lang} to {target_lang}: {translated_text}")
+    logging.debug("Translated from %s to %s: %s", ctx.from_lang, ctx.to_lang, translated_text)
 
-                    # Play music while waiting for the response (if enabled)
-                    if session.play_waiting_music:
-                        await play_waiting_music(session.source_websocket)
+    # Play music while waiting for the response (if enabled)
+    if session.play_waiting_music:
+        await play_waiting_music(router, own_buffer)
 
-            if message["type"] == "info":
-                logging.info(f"Source info: {message}")
+async def handle_info(message: dict, ctx: SessionContext):
+    # Speaker events arrive as info messages many times per turn
+    logging.debug("%s info: %s", ctx.label, message)
 
-            if message["type"] == "interrupt":
-                logging.info("Source interrupted")
+async def handle_interrupt(message: dict, ctx: SessionContext):
+    logging.info("%s interrupted", ctx.label)
 
-            if message["type"] == "error":
-                logging.error("Source WebSocket error")
+async def handle_error(message: dict, ctx: SessionContext):
+    logging.error(f"{ctx.label} WebSocket error")
 
-    except Exception as e:
-        logging.error(f"Source WebSocket error: {e}")
-    finally:
-        await cleanup_session(session_id)
-        logging.info("Source client disconnected.")
+# ConversationRelay message type -> handler
+MESSAGE_HANDLERS = {
+    "setup": handle_setup,
+    "prompt": handle_prompt,
+    "info": handle_info,
+    "interrupt": handle_interrupt,
+    "error": handle_error,
+}
 
-@app.websocket("/ws/target/{session_id}")
-async def target_websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for target language callers"""
+async def run_conversation_relay(websocket: WebSocket, session_id: str, is_source: bool):
+    """Receive ConversationRelay messages for one leg and dispatch them by type"""
     await websocket.accept()
-    call_sid: Optional[str] = None
+    ctx = SessionContext(session_id, websocket, is_source, "Source" if is_source else "Target")
 
     try:
-        while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            # logging.info(f"Target WebSocket Message: {message}")
-
-            if message["type"] == "setup":
-                call_sid = message["callSid"]
-                logging.info(f"Target ws setup initiated for call SID: {call_sid}")
-
-                # Update session with target WebSocket
-                if session_id in translation_sessions:
-                    session = translation_sessions[session_id]
-                    session.target_call_sid = call_sid
-                    session.target_websocket = websocket
-
-                    if not await check_session_readiness_and_notify(session, session_id):
-                        continue  # Skip this prompt if not ready
-
-            if message["type"] == "prompt":
-                # Phase 2: Translate target back to source
-                prompt = message["voicePrompt"]
-                logging.info(f"Target prompt: {prompt}")
-
-                if session_id in translation_sessions:
-                    session = translation_sessions[session_id]
-                    target_lang = session.target_language
-                    source_lang = session.source_language
-
-                    if not session.source_websocket:
-                        continue  # Skip this prompt if not ready
-
-                    # Translate target → source
-                    translated_text = ""
-                    async for event in translate_text_streaming(prompt, target_lang, source_lang):
-                        await session.source_websocket.send_json(event)
-                        translated_text += event["token"]
-
-                    logging.info(f"Translated from {target_lang} to {source_lang}: {translated_text}")
+        # Ends cleanly when the peer disconnects, so only real errors reach the except
+        async for data in websocket.iter_text():
+            message = orjson.loads(data)
+            logging.debug("%s WebSocket Message: %s", ctx.label, message)
 
-                    # Play music while waiting for the response
-                    if session.play_waiting_music:
-                        await play_waiting_music(session.target_websocket)
+            handler = MESSAGE_HANDLERS.get(message.get("type"))
+            if handler:
+                await handler(message, ctx)
 
-            if message["type"] == "info":
-                logging.info(f"Target info: {message}")
+    except Exception as e:
+        logging.error(f"{ctx.label} WebSocket error: {e}")
+    finally:
+        # Shielded so a cancelled connection task still tears the session down
+        await asyncio.shield(cleanup_session(session_id))
+        logging.info(f"{ctx.label} client disconnected.")
 
-            if message["type"] == "interrupt":
-                logging.warning("Target interrupted")
+@app.websocket("/ws/source/{session_id}")
+async def source_websocket_endpoint(websocket: WebSocket, session_id: str):
+    """WebSocket endpoint for source language callers"""
+    await run_conversation_relay(websocket, session_id, is_source=True)
 
-            if message["type"] == "error":
-                logging.error("Target WebSocket error")
+@app.websocket("/ws/target/{session_id}")
+async def target_websocket_endpoint(websocket: WebSocket, session_id: str):
+    """WebSocket endpoint for target language callers"""
+    await run_conversation_relay(websocket, session_id, is_source=False)
 
-    except Exception as e:
-        logging.error(f"Target WebSocket error: {e}")
-    finally:
-        await cleanup_session(session_id)
-        logging.info("Target client disconnected.")
 
+async def read_twilio_params(request: Request) -> Dict[str, str]:
+    """Parse the small urlencoded body Twilio posts to voice webhooks"""
+    body = await request.body()
+    return dict(parse_qsl(body.decode()))
 
 @app.post("/voice/target/{session_id}")
 async def target_voice_webhook(request: Request, session_id: str):
     """Handle outbound target language calls"""
-    form_data = await request.form()
-    call_sid = form_data.get("CallSid")
-    from_number = form_data.get("From")
-    to_number = form_data.get("To")
-    call_status = form_data.get("CallStatus")
+    params = await read_twilio_params(request)
+    call_sid = params.get("CallSid")
+    from_number = params.get("From")
+    to_number = params.get("To")
+    call_status = params.get("CallStatus")
 
     logging.info(f"Outbound target call from {from_number} to {to_number} with SID: {call_sid}, Status: {call_status}")
 
-    # Get the host from request headers
-    host = request.headers.get('host')
-    ws_url = f"wss://{host}/ws/target/{session_id}"
-    logging.info(f"Target WebSocket URL: {ws_url}")
-
     # Get target language and TTS settings from session or defaults
     target_language = ""
     target_tts_provider = ""
     target_voice = ""
-    if session_id in translation_sessions:
-        session = translation_sessions[session_id]
+    target_stt_provider = "deepgram"
+    session = translation_sessions.get(session_id)
+    if session is not None:
         target_language = session.target_language
         target_tts_provider = session.target_tts_provider
         target_voice = session.target_voice
+        target_stt_provider = session.target_stt_provider
+
+    # Prefer the host recorded at /initiate-call; fall back to this request's Host header
+    host = session.host if session is not None and session.host else request.headers.get('host')
+    ws_url = f"wss://{host}/ws/target/{session_id}"
+    logging.info(f"Target WebSocket URL: {ws_url}")
 
    # Generate TwiML response using the new function
     twiml = generate_conversation_relay_twiml(
         ws_url=ws_url,
         language=target_language,
         tts_provider=target_tts_provider,
-        voice=target_voice
+        voice=target_voice,
+        stt_provider=target_stt_provider
     )
 
     return Response(content=twiml, media_type="text/xml")
@@ -433,43 +830,64 @@ async def target_voice_webhook(request: Request, session_id: str):
 @app.post("/voice/source/{session_id}")
 async def source_voice_webhook(request: Request, session_id: str):
     """Handle outbound source language calls"""
-    form_data = await request.form()
-    call_sid = form_data.get("CallSid")
-    from_number = form_data.get("From")
-    to_number = form_data.get("To")
-    call_status = form_data.get("CallStatus")
+    params = await read_twilio_params(request)
+    call_sid = params.get("CallSid")
+    from_number = params.get("From")
+    to_number = params.get("To")
+    call_status = params.get("CallStatus")
 
     logging.info(f"Outbound source call from {from_number} to {to_number} with SID: {call_sid}, Status: {call_status}")
 
-    # Get the host from request headers
-    host = request.headers.get('host')
-    ws_url = f"wss://{host}/ws/source/{session_id}"
-    logging.info(f"Source WebSocket URL: {ws_url}")
-
     # Get source language and TTS settings from session or defaults
     source_language = ""  # default
     source_tts_provider = ""  # default
     source_voice = ""  # default
-    if session_id in translation_sessions:
-        session = translation_sessions[session_id]
+    source_stt_provider = "deepgram"  # default
+    session = translation_sessions.get(session_id)
+    if session is not None:
         source_language = session.source_language
         source_tts_provider = session.source_tts_provider
         source_voice = session.source_voice
+        source_stt_provider = session.source_stt_provider
+
+    # Prefer the host recorded at /initiate-call; fall back to this request's Host header
+    host = session.host if session is not None and session.host else request.headers.get('host')
+    ws_url = f"wss://{host}/ws/source/{session_id}"
+    logging.info(f"Source WebSocket URL: {ws_url}")
 
      # Generate TwiML response using the new function
     twiml = generate_conversation_relay_twiml(
         ws_url=ws_url,
         language=source_language,
         tts_provider=source_tts_provider,
-        voice=source_voice
+        voice=source_voice,
+        stt_provider=source_stt_provider
     )
 
     return Response(content=twiml, media_type="text/xml")
 
+def load_start_page() -> Tuple[bytes, bytes, str]:
+    """Read start.html and return its body, gzip-compressed body and ETag"""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "start.html"), "rb") as page:
+        body = page.read()
+    return body, gzip.compress(body, 9), '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+# The form never changes at runtime, so read, compress and tag it once
+START_HTML, START_HTML_GZIP, START_HTML_ETAG = load_start_page()
+START_HTML_HEADERS = {"ETag": START_HTML_ETAG, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
 @app.get("/")
-async def call_form():
+async def call_form(request: Request):
     """Serve HTML form for initiating translation calls"""
-    return FileResponse("start.html")
+    if request.headers.get("if-none-match") == START_HTML_ETAG:
+        return Response(status_code=304, headers=START_HTML_HEADERS)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=START_HTML_GZIP,
+            media_type="text/html",
+            headers={**START_HTML_HEADERS, "Content-Encoding": "gzip"},
+        )
+    return Response(content=START_HTML, media_type="text/html", headers=START_HTML_HEADERS)
 
 @app.post("/initiate-call")
 async def initiate_call(request: Request):
@@ -501,8 +919,8 @@ async def initiate_call(request: Request):
         )
 
     try:
-        # Create unique session ID
-        session_id = f"session_{int(time.time())}_{from_number.replace('+', '')}_{to_number.replace('+', '')}"
+        # Create unique session ID; random so phone numbers stay out of webhook URLs and logs
+        session_id = uuid.uuid4().hex
 
         # Create translation session
         session = TranslationSession(session_id, "")
@@ -514,6 +932,8 @@ async def initiate_call(request: Request):
         session.source_voice = source_voice
         session.target_tts_provider = target_tts_provider
         session.target_voice = target_voice
+        session.source_stt_provider = stt_provider_for(source_language)
+        session.target_stt_provider = stt_provider_for(target_language)
         session.host = request.headers.get('host')
         session.play_waiting_music = play_waiting_music  # Set the flag
         translation_sessions[session_id] = session
@@ -522,9 +942,11 @@ async def initiate_call(request: Request):
         logging.info(f"From: {from_number} ({source_language}) -> To: {to_number} ({target_language})")
         logging.info(f"Source TTS: {source_tts_provider}/{source_voice}, Target TTS: {target_tts_provider}/{target_voice}")
 
-        # Create outbound calls to both parties
-        await create_outbound_source_call(session_id, session.host, from_number, twilio_number)
-        await create_outbound_target_call(session_id, session.host, to_number, twilio_number)
+        # Create outbound calls to both parties concurrently
+        await asyncio.gather(
+            create_outbound_source_call(session_id, session.host, from_number, twilio_number),
+            create_outbound_target_call(session_id, session.host, to_number, twilio_number),
+        )
 
 
         return JSONResponse(
@@ -548,5 +970,14 @@ async def initiate_call(request: Request):
         )
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
-
+    # Sessions live in process memory and both WebSocket legs must meet in the same
+    # process, so this runs a single worker; scale out with one instance per port
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8080")),
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,  # Frames are short JSON; compression only costs CPU
+    )